@@ -8,16 +8,17 @@ from pathlib import Path
 def main():
     print("=== Azure SQL MCP Setup ===\n")
 
-    # Install dependencies
-    print("Installing package...")
-    subprocess.run([sys.executable, "-m", "pip", "install", "."], check=True)
-    print()
-
     # Auth type
     auth = ""
     while auth not in ("sql", "az_cli"):
         auth = input("Auth type (sql / az_cli): ").strip().lower()
 
+    # Install dependencies
+    print("Installing package...")
+    target = ".[az_cli]" if auth == "az_cli" else "."
+    subprocess.run([sys.executable, "-m", "pip", "install", target], check=True)
+    print()
+
     # Server and database
     server = input("Server (e.g. myserver.database.windows.net): ").strip()
     database = input("Database name: ").strip()
@@ -1,10 +1,18 @@
+import asyncio
+import base64
+import functools
+import hashlib
+import io
 import json
 import logging
+import operator
 import os
-import struct
-import subprocess
+import queue
+import re
+import threading
+import time
 from contextlib import contextmanager
-from typing import Any
+from typing import Any, Final
 
 import pyodbc
 from mcp import types
@@ -13,87 +21,470 @@ from mcp.server.stdio import stdio_server
 
 logger = logging.getLogger(__name__)
 
+# Match the SET options SSMS uses so cached plans are shared with it.
+_SQL_INIT_CONN: Final[str] = "SET ARITHABORT ON"
+# NOCOUNT drops the per-statement DONE_IN_PROC tokens, and dirty reads
+# keep catalog queries from waiting on locks held by concurrent DDL.
+_SQL_INIT_META_CONN: Final[str] = "SET NOCOUNT ON; SET TRANSACTION ISOLATION LEVEL READ UNCOMMITTED"
+_SQL_PING: Final[str] = "SELECT 1"
 
-def _get_az_token() -> str:
-    result = subprocess.run(
-        ["az", "account", "get-access-token", "--resource", "https://database.windows.net", "--query", "accessToken", "-o", "tsv"],
-        capture_output=True, text=True, check=True,
+_SQL_LIST_SCHEMAS: Final[str] = "SELECT SCHEMA_NAME FROM INFORMATION_SCHEMA.SCHEMATA ORDER BY SCHEMA_NAME"
+
+# The sys catalog views are what INFORMATION_SCHEMA is built on; querying
+# them directly skips the extra joins and filters of the standard views.
+_SQL_LIST_TABLES: Final[str] = """
+    SELECT s.name, t.name
+    FROM sys.tables t
+    JOIN sys.schemas s ON t.schema_id = s.schema_id
+    WHERE (CAST(? AS sysname) IS NULL OR s.name = ?)
+    ORDER BY s.name, t.name
+"""
+
+# SIZE follows INFORMATION_SCHEMA.COLUMNS: character length, else precision,scale for numeric types.
+_SQL_DESCRIBE_TABLE: Final[str] = """
+    WITH tbl AS (
+        SELECT o.object_id
+        FROM sys.objects o
+        JOIN sys.schemas s ON o.schema_id = s.schema_id
+        WHERE o.type IN ('U', 'V') AND s.name = ? AND o.name = ?
+    ),
+    pk AS (
+        SELECT ic.column_id
+        FROM tbl
+        JOIN sys.indexes i ON i.object_id = tbl.object_id AND i.is_primary_key = 1
+        JOIN sys.index_columns ic ON ic.object_id = i.object_id AND ic.index_id = i.index_id
     )
-    return result.stdout.strip()
+    SELECT
+        c.name AS COLUMN_NAME,
+        ISNULL(TYPE_NAME(c.system_type_id), ty.name) AS DATA_TYPE,
+        COALESCE(
+            CAST(COLUMNPROPERTY(c.object_id, c.name, 'CharMaxLen') AS VARCHAR),
+            CASE WHEN c.system_type_id IN (48, 52, 56, 60, 106, 108, 122, 127)
+                 THEN CAST(c.precision AS VARCHAR) + ',' + CAST(c.scale AS VARCHAR) END,
+            ''
+        ) AS SIZE,
+        CASE WHEN c.is_nullable = 1 THEN 'YES' ELSE 'NO' END AS IS_NULLABLE,
+        CASE WHEN pk.column_id IS NOT NULL THEN 'YES' ELSE 'NO' END AS IS_PK
+    FROM tbl
+    JOIN sys.columns c ON c.object_id = tbl.object_id
+    LEFT JOIN sys.types ty ON ty.user_type_id = c.user_type_id
+    LEFT JOIN pk ON pk.column_id = c.column_id
+    ORDER BY c.column_id
+"""
+_DESCRIBE_COLUMNS: Final[tuple[str, ...]] = ("COLUMN_NAME", "DATA_TYPE", "SIZE", "IS_NULLABLE", "IS_PK")
+
+# TOP is bound as a parameter so one cached plan serves every row count.
+# Identifiers can't be bound, so they are bracket-quoted into the template.
+_SQL_SELECT_TOP: Final[str] = "SELECT TOP (?) * FROM [{schema}].[{table}]"
+
+
+# Connections are pooled here rather than by the driver manager so that
+# AAD-token connections are never handed to a different auth context.
+pyodbc.pooling = False
+
+# maxsize=0 would make the queue unbounded, so keep at least one slot.
+_POOL_SIZE = max(1, int(os.environ.get("AZURE_SQL_POOL_SIZE", "5")))
+# Azure SQL's gateway drops sessions idle for about 30 minutes; retire pooled
+# connections well before that instead of handing out a dead link.
+_POOL_MAX_IDLE = float(os.environ.get("AZURE_SQL_POOL_MAX_IDLE", "600"))
+# Entries are (connection, time it was returned to the pool).
+_POOL: queue.LifoQueue[tuple[pyodbc.Connection, float]] = queue.LifoQueue(maxsize=_POOL_SIZE)
+# Catalog reads get their own sessions so their relaxed isolation never
+# leaks into user queries.
+_META_POOL: queue.LifoQueue[tuple[pyodbc.Connection, float]] = queue.LifoQueue(maxsize=_POOL_SIZE)
+
+
+_SQL_SCOPE = "https://database.windows.net/.default"
+_TOKEN_REFRESH_MARGIN = 300
+_TOKEN_CACHE: dict[str, tuple[bytes, float]] = {}
+_TOKEN_LOCK = threading.Lock()
+
+
+# Covers az login, managed identity and service-principal env vars; the SDK
+# keeps fetched tokens in memory, so no subprocess runs on the connect path.
+# Built on first use so SQL-auth deployments never need azure-identity.
+@functools.cache
+def _credential():
+    from azure.identity import DefaultAzureCredential
+
+    return DefaultAzureCredential()
+
+
+def _get_token_struct(scope: str = _SQL_SCOPE) -> bytes:
+    with _TOKEN_LOCK:
+        cached = _TOKEN_CACHE.get(scope)
+        if cached and time.time() < cached[1] - _TOKEN_REFRESH_MARGIN:
+            return cached[0]
+        access_token = _credential().get_token(scope)
+        # SQL_COPT_SS_ACCESS_TOKEN expects a little-endian length prefix followed by the UTF-16-LE token.
+        token_bytes = access_token.token.encode("utf-16-le")
+        token_struct = len(token_bytes).to_bytes(4, "little") + token_bytes
+        _TOKEN_CACHE[scope] = (token_struct, access_token.expires_on)
+        return token_struct
 
 
+_AUTH = os.environ.get("AZURE_SQL_AUTH", "sql").lower()
+
+
+# Environment is read once, on first use rather than at import, so the
+# module still imports cleanly when the server isn't configured yet.
+@functools.cache
 def _build_conn_str() -> str:
     server = os.environ["AZURE_SQL_SERVER"]
     database = os.environ["AZURE_SQL_DATABASE"]
     trust_cert = os.environ.get("AZURE_SQL_TRUST_CERT", "no").lower()
-    return (
+    conn_str = (
         f"DRIVER={{ODBC Driver 18 for SQL Server}};"
         f"SERVER={server};"
         f"DATABASE={database};"
         f"Encrypt=yes;"
         f"TrustServerCertificate={trust_cert};"
     )
+    if _AUTH != "az_cli":
+        user = os.environ["AZURE_SQL_USER"]
+        password = os.environ["AZURE_SQL_PASSWORD"]
+        conn_str += f"UID={user};PWD={password};"
+    return conn_str
+
+
+def _init_conn(conn: pyodbc.Connection, metadata: bool) -> None:
+    conn.cursor().execute(_SQL_INIT_CONN)
+    if metadata:
+        conn.cursor().execute(_SQL_INIT_META_CONN)
+
+
+def _connect(metadata: bool = False) -> pyodbc.Connection:
+    if _AUTH == "az_cli":
+        conn = pyodbc.connect(_build_conn_str(), attrs_before={1256: _get_token_struct()})
+    else:
+        conn = pyodbc.connect(_build_conn_str())
+    try:
+        _init_conn(conn, metadata)
+    except BaseException:
+        conn.close()
+        raise
+    return conn
+
+
+def _release(conn: pyodbc.Connection, pool: queue.LifoQueue) -> None:
+    try:
+        conn.rollback()
+        conn.cursor().execute(_SQL_PING).fetchall()
+        pool.put_nowait((conn, time.monotonic()))
+    except (pyodbc.Error, queue.Full):
+        _close(conn)
+
+
+def _close(conn: pyodbc.Connection) -> None:
+    try:
+        conn.close()
+    except pyodbc.Error:
+        pass
 
 
+def _checkout(pool: queue.LifoQueue, metadata: bool) -> pyodbc.Connection:
+    while True:
+        try:
+            conn, released_at = pool.get_nowait()
+        except queue.Empty:
+            return _connect(metadata)
+        if time.monotonic() - released_at < _POOL_MAX_IDLE:
+            return conn
+        _close(conn)
+
+
+# A session that ran caller-supplied SQL may have switched database, changed
+# SET options or left temp tables behind, none of which a rollback undoes, so
+# it is closed rather than handed to the next caller.
 @contextmanager
-def get_connection():
-    auth = os.environ.get("AZURE_SQL_AUTH", "sql").lower()
-    conn_str = _build_conn_str()
-    conn = None
+def get_connection(metadata: bool = False, user_sql: bool = False):
+    pool = _META_POOL if metadata else _POOL
+    conn = _checkout(pool, metadata)
     try:
-        if auth == "az_cli":
-            token = _get_az_token()
-            token_bytes = token.encode("utf-16-le")
-            token_struct = struct.pack(f"<I{len(token_bytes)}s", len(token_bytes), token_bytes)
-            conn = pyodbc.connect(conn_str, attrs_before={1256: token_struct})
-        else:
-            user = os.environ["AZURE_SQL_USER"]
-            password = os.environ["AZURE_SQL_PASSWORD"]
-            conn = pyodbc.connect(conn_str + f"UID={user};PWD={password};")
+        if user_sql:
+            # Caller SQL commits as it runs, like an SSMS session; that covers
+            # writes that also return rows (OUTPUT clauses, procs, batches).
+            conn.autocommit = True
         yield conn
     finally:
-        if conn:
-            conn.close()
+        if user_sql:
+            _close(conn)
+        else:
+            _release(conn, pool)
+
+
+_META_TTL = float(os.environ.get("AZURE_SQL_META_TTL", "300"))
+# describe_table entries are keyed by caller-supplied names, so cap the
+# number kept; the oldest insertion is evicted first.
+_META_MAX_ENTRIES = 256
+_META_CACHE: dict[tuple, tuple[float, Any]] = {}
+
+
+def _meta_get(key: tuple) -> Any:
+    entry = _META_CACHE.get(key)
+    if entry and time.monotonic() < entry[0]:
+        return entry[1]
+    return None
+
+
+def _meta_put(key: tuple, value: Any) -> Any:
+    _META_CACHE.pop(key, None)
+    while len(_META_CACHE) >= _META_MAX_ENTRIES:
+        _META_CACHE.pop(next(iter(_META_CACHE)))
+    _META_CACHE[key] = (time.monotonic() + _META_TTL, value)
+    return value
+
+
+def _meta_key(name: str, arguments: dict[str, Any]) -> tuple | None:
+    if name == "list_tables":
+        return ("tables", arguments.get("schema") or None)
+    if name == "describe_table":
+        return ("describe", arguments["schema"], arguments["table"])
+    return None
+
 
+_FETCH_SIZE = 1000
 
-def _rows_to_text(cursor: pyodbc.Cursor) -> str:
-    columns = [desc[0] for desc in cursor.description]
-    rows = cursor.fetchall()
-    if not rows:
+
+_BRACKET_ESCAPE = str.maketrans({"]": "]]"})
+# Names are bracket-quoted, so only what quoting can't carry is refused: sysname's
+# 128-character limit and control characters.
+_IDENT = re.compile(r"[^\x00-\x1f\x7f]{1,128}")
+
+
+def _check_table_ident(schema: str, table: str) -> None:
+    if not (_IDENT.fullmatch(schema) and _IDENT.fullmatch(table)):
+        raise ValueError(f"Invalid table name: {schema}.{table}")
+
+
+def _select_top_sql(schema: str, table: str) -> str:
+    return _SQL_SELECT_TOP.format_map({
+        "schema": schema.translate(_BRACKET_ESCAPE),
+        "table": table.translate(_BRACKET_ESCAPE),
+    })
+
+
+def _rows_to_text(
+    cursor: pyodbc.Cursor, columns: tuple[str, ...] | None = None, limit: int | None = None
+) -> str:
+    if columns is None:
+        columns = tuple(desc[0] for desc in cursor.description)
+    col_widths = [len(col) for col in columns]
+    out_rows = []
+    cursor.arraysize = _FETCH_SIZE
+    remaining = limit
+    while remaining is None or remaining > 0:
+        batch = cursor.fetchmany() if remaining is None else cursor.fetchmany(min(_FETCH_SIZE, remaining))
+        if not batch:
+            break
+        if remaining is not None:
+            remaining -= len(batch)
+        for row in batch:
+            srow = ["NULL" if v is None else str(v) for v in row]
+            for i, v in enumerate(srow):
+                if len(v) > col_widths[i]:
+                    col_widths[i] = len(v)
+            out_rows.append(srow)
+    if not out_rows:
         return "(no rows)"
-    col_widths = [max(len(col), max((len(str(row[i])) for row in rows), default=0)) for i, col in enumerate(columns)]
-    sep = "+-" + "-+-".join("-" * w for w in col_widths) + "-+"
-    header = "| " + " | ".join(col.ljust(col_widths[i]) for i, col in enumerate(columns)) + " |"
-    lines = [sep, header, sep]
-    for row in rows:
-        lines.append("| " + " | ".join(str(v).ljust(col_widths[i]) if v is not None else "NULL".ljust(col_widths[i]) for i, v in enumerate(row)) + " |")
-    lines.append(sep)
-    lines.append(f"({len(rows)} row{'s' if len(rows) != 1 else ''})")
-    return "\n".join(lines)
+    sep = "+-" + "-+-".join("-" * w for w in col_widths) + "-+\n"
+    fmt = "| " + " | ".join("{:<%d}" % w for w in col_widths) + " |\n"
+    buf = io.StringIO()
+    buf.write(sep)
+    buf.write(fmt.format(*columns))
+    buf.write(sep)
+    for srow in out_rows:
+        buf.write(fmt.format(*srow))
+    buf.write(sep)
+    buf.write(f"({len(out_rows)} row{'s' if len(out_rows) != 1 else ''})")
+    return buf.getvalue()
+
+
+_DEFAULT_MAX_ROWS = 1000
+_MAX_ROWS_CAP = 50_000
+
+
+def _query_digest(sql: str, params: list) -> str:
+    # Params are part of the identity: the same text with other values is a different result set.
+    return hashlib.sha256(json.dumps([sql, params], default=str).encode()).hexdigest()[:16]
+
+
+def _encode_page_token(sql: str, params: list, offset: int) -> str:
+    payload = {"sql": _query_digest(sql, params), "offset": offset}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode("ascii")
+
+
+def _decode_page_token(token: str | None, sql: str, params: list) -> int:
+    if not token:
+        return 0
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        offset = int(payload["offset"])
+        matches = payload["sql"] == _query_digest(sql, params)
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor") from None
+    if not matches or offset < 0:
+        raise ValueError("Cursor does not belong to this query")
+    return offset
+
+
+def _more_rows_notice(sql: str, params: list, next_offset: int) -> str:
+    token = _encode_page_token(sql, params, next_offset)
+    return f'\n\nMore rows available. Call again with cursor="{token}" to continue.'
+
+
+def _page_args(arguments: dict[str, Any], sql: str, params: list) -> tuple[int, int]:
+    max_rows = max(1, min(int(arguments.get("max_rows", _DEFAULT_MAX_ROWS)), _MAX_ROWS_CAP))
+    return max_rows, _decode_page_token(arguments.get("cursor"), sql, params)
+
+
+def _query_arrow(arguments: dict[str, Any]) -> str | None:
+    sql = arguments["sql"]
+    params = arguments.get("params") or []
+    # turbodbc cannot pass an access token before connecting, so only SQL auth
+    # is supported; batched parameter sets go through fast_executemany instead.
+    if _AUTH == "az_cli" or (params and all(isinstance(p, list) for p in params)):
+        return None
+    max_rows, offset = _page_args(arguments, sql, params)
+    try:
+        import pyarrow.ipc
+        import turbodbc
+    except ImportError:
+        return None
+    conn = turbodbc.connect(
+        connection_string=_build_conn_str(),
+        turbodbc_options=turbodbc.make_options(use_async_io=True, autocommit=True),
+    )
+    try:
+        conn.cursor().execute(_SQL_INIT_CONN)
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        if not cursor.description:
+            return f"{cursor.rowcount} row(s) affected"
+        # turbodbc can't skip rows server-side, so earlier pages are fetched and
+        # dropped; one row past the page is enough to know whether more remain.
+        end = offset + max_rows
+        batches = []
+        fetched = 0
+        for batch in cursor.fetcharrowbatches():
+            batches.append(batch)
+            fetched += batch.num_rows
+            if fetched > end:
+                break
+        table = pyarrow.concat_tables(batches).slice(offset, max_rows) if batches else cursor.fetchallarrow()
+    finally:
+        conn.close()
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    output = base64.b64encode(sink.getvalue().to_pybytes()).decode("ascii")
+    if fetched > end:
+        output += _more_rows_notice(sql, params, end)
+    return output
+
+
+def _run_with_conn(fn, *args, metadata: bool = False, user_sql: bool = False):
+    with get_connection(metadata, user_sql) as conn:
+        return fn(conn, *args)
+
+
+def _fetch_tables(cursor: pyodbc.Cursor, schema: str | None = None) -> list[pyodbc.Row]:
+    cursor.execute(_SQL_LIST_TABLES, schema, schema)
+    return cursor.fetchall()
+
+
+def _do_list_resources(conn: pyodbc.Connection) -> list[types.Resource]:
+    out = []
+    out_append = out.append
+    for schema, table in map(operator.itemgetter(0, 1), _fetch_tables(conn.cursor())):
+        name = f"{schema}.{table}"
+        out_append(types.Resource(uri=f"mssql://{name}", name=name, description="Table " + name, mimeType="text/plain"))
+    return out
+
+
+def _do_read_resource(conn: pyodbc.Connection, schema: str, table: str) -> str:
+    cursor = conn.cursor()
+    cursor.execute(_select_top_sql(schema, table), 100)
+    return _rows_to_text(cursor)
+
+
+def _tool_list_schemas(cursor: pyodbc.Cursor, arguments: dict[str, Any]) -> str:
+    cursor.execute(_SQL_LIST_SCHEMAS)
+    schemas = [row[0] for row in cursor.fetchall()]
+    return "\n".join(schemas)
+
+
+def _tool_list_tables(cursor: pyodbc.Cursor, arguments: dict[str, Any]) -> str:
+    tables = _fetch_tables(cursor, arguments.get("schema") or None)
+    output = "\n".join(f"{row[0]}.{row[1]}" for row in tables)
+    return output + f"\n\n({len(tables)} tables)"
+
+
+def _tool_describe_table(cursor: pyodbc.Cursor, arguments: dict[str, Any]) -> str:
+    schema = arguments["schema"]
+    table = arguments["table"]
+    cursor.execute(_SQL_DESCRIBE_TABLE, schema, table)
+    return _rows_to_text(cursor, _DESCRIBE_COLUMNS)
+
+
+def _tool_sample_table(cursor: pyodbc.Cursor, arguments: dict[str, Any]) -> str:
+    schema = arguments["schema"]
+    table = arguments["table"]
+    n = min(int(arguments.get("rows", 50)), 500)
+    cursor.execute(_select_top_sql(schema, table), n)
+    return _rows_to_text(cursor)
+
+
+def _tool_execute_query(cursor: pyodbc.Cursor, arguments: dict[str, Any]) -> str:
+    sql = arguments["sql"]
+    params = arguments.get("params") or []
+    if params and all(isinstance(p, list) for p in params):
+        # fast_executemany binds all rows as one parameter array instead of a round-trip per row.
+        cursor.fast_executemany = True
+        cursor.executemany(sql, params)
+        return f"{len(params)} parameter set(s) executed"
+    max_rows, offset = _page_args(arguments, sql, params)
+    cursor.execute(sql, *params)
+    if not cursor.description:
+        return f"{cursor.rowcount} row(s) affected"
+    if offset:
+        cursor.skip(offset)
+    # Stop after max_rows so a runaway result set can't be pulled into memory whole.
+    output = _rows_to_text(cursor, limit=max_rows)
+    if cursor.fetchone() is not None:
+        output += _more_rows_notice(sql, params, offset + max_rows)
+    return output
+
+
+_TOOLS = {
+    "list_schemas": _tool_list_schemas,
+    "list_tables": _tool_list_tables,
+    "describe_table": _tool_describe_table,
+    "sample_table": _tool_sample_table,
+    "execute_query": _tool_execute_query,
+}
+
+
+_METADATA_TOOLS = frozenset({"list_schemas", "list_tables", "describe_table"})
+
+
+def _do_call_tool(conn: pyodbc.Connection, handler, arguments: dict[str, Any]) -> str:
+    return handler(conn.cursor(), arguments)
 
 
 app = Server("azure-sql-mcp")
 
 
+# pyodbc releases the GIL while waiting on the server, so running each
+# handler's database work in a worker thread keeps the stdio loop free to
+# accept the next request.
 @app.list_resources()
 async def list_resources() -> list[types.Resource]:
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT TABLE_SCHEMA, TABLE_NAME
-            FROM INFORMATION_SCHEMA.TABLES
-            WHERE TABLE_TYPE = 'BASE TABLE'
-            ORDER BY TABLE_SCHEMA, TABLE_NAME
-        """)
-        return [
-            types.Resource(
-                uri=f"mssql://{row[0]}.{row[1]}",
-                name=f"{row[0]}.{row[1]}",
-                description=f"Table {row[0]}.{row[1]}",
-                mimeType="text/plain",
-            )
-            for row in cursor.fetchall()
-        ]
+    cached = _meta_get(("resources",))
+    if cached is not None:
+        return cached
+    resources = await asyncio.to_thread(_run_with_conn, _do_list_resources, metadata=True)
+    return _meta_put(("resources",), resources)
 
 
 @app.read_resource()
@@ -103,10 +494,8 @@ async def read_resource(uri: types.AnyUrl) -> str:
     if len(parts) != 2:
         raise ValueError(f"Invalid resource URI: {uri}")
     schema, table = parts
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute(f"SELECT TOP 100 * FROM [{schema}].[{table}]")
-        return _rows_to_text(cursor)
+    _check_table_ident(schema, table)
+    return await asyncio.to_thread(_run_with_conn, _do_read_resource, schema, table)
 
 
 @app.list_tools()
@@ -152,13 +541,45 @@ async def list_tools() -> list[types.Tool]:
                 "required": ["schema", "table"],
             },
         ),
+        types.Tool(
+            name="invalidate_metadata",
+            description="Clear cached table listings and descriptions so the next call reloads them",
+            inputSchema={"type": "object", "properties": {}},
+        ),
         types.Tool(
             name="execute_query",
-            description="Execute a SQL query against the database",
+            description="Execute a SQL query against the database. Runs with autocommit, so writes persist as each statement completes",
             inputSchema={
                 "type": "object",
                 "properties": {
                     "sql": {"type": "string", "description": "SQL query to execute"},
+                    "params": {
+                        "type": "array",
+                        "description": (
+                            "Values for ? placeholders (optional). Pass a list of lists to run the "
+                            "statement once per row as a single batch"
+                        ),
+                    },
+                    "max_rows": {
+                        "type": "integer",
+                        "description": f"Maximum rows to return (default {_DEFAULT_MAX_ROWS}, max {_MAX_ROWS_CAP})",
+                    },
+                    "cursor": {
+                        "type": "string",
+                        "description": (
+                            "Continuation cursor from a previous truncated result of the same query and params. "
+                            "Pages are re-read by offset, so the query needs a deterministic ORDER BY"
+                        ),
+                    },
+                    "format": {
+                        "type": "string",
+                        "enum": ["text", "arrow"],
+                        "description": (
+                            "Result format (default text). arrow returns a base64 Arrow IPC stream when "
+                            "turbodbc and pyarrow are installed and SQL auth is used, otherwise text. "
+                            "Both formats honour max_rows and end with a continuation cursor when truncated"
+                        ),
+                    },
                 },
                 "required": ["sql"],
             },
@@ -168,79 +589,41 @@ async def list_tools() -> list[types.Tool]:
 
 @app.call_tool()
 async def call_tool(name: str, arguments: dict[str, Any]) -> list[types.TextContent]:
-    with get_connection() as conn:
-        cursor = conn.cursor()
+    if name == "invalidate_metadata":
+        count = len(_META_CACHE)
+        _META_CACHE.clear()
+        return [types.TextContent(type="text", text=f"Cleared {count} cached metadata entries")]
 
-        if name == "list_schemas":
-            cursor.execute("SELECT SCHEMA_NAME FROM INFORMATION_SCHEMA.SCHEMATA ORDER BY SCHEMA_NAME")
-            schemas = [row[0] for row in cursor.fetchall()]
-            output = "\n".join(schemas)
-
-        elif name == "list_tables":
-            schema = arguments.get("schema")
-            if schema:
-                cursor.execute("""
-                    SELECT TABLE_SCHEMA, TABLE_NAME
-                    FROM INFORMATION_SCHEMA.TABLES
-                    WHERE TABLE_TYPE = 'BASE TABLE' AND TABLE_SCHEMA = ?
-                    ORDER BY TABLE_NAME
-                """, schema)
-            else:
-                cursor.execute("""
-                    SELECT TABLE_SCHEMA, TABLE_NAME
-                    FROM INFORMATION_SCHEMA.TABLES
-                    WHERE TABLE_TYPE = 'BASE TABLE'
-                    ORDER BY TABLE_SCHEMA, TABLE_NAME
-                """)
-            tables = cursor.fetchall()
-            output = "\n".join(f"{row[0]}.{row[1]}" for row in tables)
-            output += f"\n\n({len(tables)} tables)"
-
-        elif name == "describe_table":
-            schema = arguments["schema"]
-            table = arguments["table"]
-            cursor.execute("""
-                SELECT
-                    c.COLUMN_NAME,
-                    c.DATA_TYPE,
-                    COALESCE(CAST(c.CHARACTER_MAXIMUM_LENGTH AS VARCHAR), CAST(c.NUMERIC_PRECISION AS VARCHAR) + ',' + CAST(c.NUMERIC_SCALE AS VARCHAR), '') AS SIZE,
-                    c.IS_NULLABLE,
-                    CASE WHEN pk.COLUMN_NAME IS NOT NULL THEN 'YES' ELSE 'NO' END AS IS_PK
-                FROM INFORMATION_SCHEMA.COLUMNS c
-                LEFT JOIN (
-                    SELECT ku.COLUMN_NAME
-                    FROM INFORMATION_SCHEMA.TABLE_CONSTRAINTS tc
-                    JOIN INFORMATION_SCHEMA.KEY_COLUMN_USAGE ku
-                        ON tc.CONSTRAINT_NAME = ku.CONSTRAINT_NAME
-                        AND tc.TABLE_SCHEMA = ku.TABLE_SCHEMA
-                        AND tc.TABLE_NAME = ku.TABLE_NAME
-                    WHERE tc.CONSTRAINT_TYPE = 'PRIMARY KEY'
-                      AND tc.TABLE_SCHEMA = ?
-                      AND tc.TABLE_NAME = ?
-                ) pk ON c.COLUMN_NAME = pk.COLUMN_NAME
-                WHERE c.TABLE_SCHEMA = ? AND c.TABLE_NAME = ?
-                ORDER BY c.ORDINAL_POSITION
-            """, schema, table, schema, table)
-            output = _rows_to_text(cursor)
-
-        elif name == "sample_table":
-            schema = arguments["schema"]
-            table = arguments["table"]
-            n = min(int(arguments.get("rows", 50)), 500)
-            cursor.execute(f"SELECT TOP {n} * FROM [{schema}].[{table}]")
-            output = _rows_to_text(cursor)
-
-        elif name == "execute_query":
-            cursor.execute(arguments["sql"])
-            if cursor.description:
-                output = _rows_to_text(cursor)
-            else:
-                output = f"{cursor.rowcount} row(s) affected"
+    handler = _TOOLS.get(name)
+    if handler is None:
+        raise ValueError(f"Unknown tool: {name}")
+    if name == "sample_table":
+        _check_table_ident(arguments["schema"], arguments["table"])
 
-        else:
-            raise ValueError(f"Unknown tool: {name}")
+    key = _meta_key(name, arguments)
+    if key is not None:
+        cached = _meta_get(key)
+        if cached is not None:
+            return [types.TextContent(type="text", text=cached)]
 
-        return [types.TextContent(type="text", text=output)]
+    try:
+        output = None
+        if name == "execute_query" and arguments.get("format") == "arrow":
+            # Decided before a pyodbc connection is checked out, since the Arrow
+            # path runs on its own turbodbc connection.
+            output = await asyncio.to_thread(_query_arrow, arguments)
+        if output is None:
+            output = await asyncio.to_thread(
+                _run_with_conn, _do_call_tool, handler, arguments,
+                metadata=name in _METADATA_TOOLS, user_sql=name == "execute_query",
+            )
+    finally:
+        if name == "execute_query":
+            # Caller SQL is autocommitted and may have been DDL, even if it later failed.
+            _META_CACHE.clear()
+    if key is not None:
+        _meta_put(key, output)
+    return [types.TextContent(type="text", text=output)]
 
 
 async def main() -> None: